@@ -1,6 +1,8 @@
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 from database import Base, Event, Ticket, get_db_session
+from price_alerts import evaluate_new_snapshots
+from price_index import parse_snapshot_datetime, update_price_index
 from sqlalchemy import create_engine
 import os
 import pathlib
@@ -29,7 +31,7 @@ def init_db():
     return engine
 
 def load_json_from_s3(bucket_url='https://tixel-data.s3.ap-southeast-2.amazonaws.com/events/'):
-    """Load all JSON files from S3 bucket, caching them locally"""
+    """Load all JSON files from S3 bucket, caching them locally. Returns events keyed by snapshot folder."""
     # Create data directory if it doesn't exist
     data_dir = pathlib.Path(__file__).parent / 'data'
     data_dir.mkdir(exist_ok=True)
@@ -48,15 +50,16 @@ def load_json_from_s3(bucket_url='https://tixel-data.s3.ap-southeast-2.amazonaws
         # Find all Key elements (file paths)
         namespace = {'s3': 'http://s3.amazonaws.com/doc/2006-03-01/'}
         files = [key.text for key in root.findall('.//s3:Key', namespace) 
-                if key.text.endswith('.json') and key.text != 'events/index.json']
+                if key.text.endswith('.json') and key.text != 'events/index.json'
+                and '/parts/' not in key.text]  # Checkpointed pages of in-progress scrape runs
     except requests.RequestException as e:
         print(f"Error listing bucket contents: {e}")
-        return []
+        return {}
     except ElementTree.ParseError as e:
         print(f"Error parsing bucket listing: {e}")
-        return []
+        return {}
     
-    all_events = []
+    snapshots = {}
     for file_path in files:
         # Get relative path from events/ directory
         relative_path = file_path.replace('events/', '', 1)
@@ -92,6 +95,9 @@ def load_json_from_s3(bucket_url='https://tixel-data.s3.ap-southeast-2.amazonaws
                 print(f"Error downloading {relative_path}: {e}")
                 continue
         
+        # Snapshot folder the file was saved under, e.g. 20241208_120000
+        snapshot_events = snapshots.setdefault(relative_path.split('/')[0], [])
+        
         # Handle different JSON structures
         if isinstance(json_data, dict):
             # If it's a dict, events might be nested under category keys
@@ -99,12 +105,12 @@ def load_json_from_s3(bucket_url='https://tixel-data.s3.ap-southeast-2.amazonaws
                 if isinstance(events, list):
                     for event in events:
                         event['category'] = category  # Add category to event data
-                        all_events.append(event)
+                        snapshot_events.append(event)
         elif isinstance(json_data, list):
-            all_events.extend(json_data)
+            snapshot_events.extend(json_data)
     
-    print(f"Loaded {len(all_events)} events")
-    return all_events
+    print(f"Loaded {sum(len(events) for events in snapshots.values())} events from {len(snapshots)} snapshots")
+    return snapshots
 
 def extract_venue_details(event_data):
     """Extract venue details from event data"""
@@ -200,19 +206,29 @@ def populate_database():
     try:
         # Load data from S3
         print("Loading data from S3...")
-        events = load_json_from_s3()
-        print(f"Loaded {len(events)} events")
+        snapshots = load_json_from_s3()
+        
+        # Add any new snapshots to the price time-series index
+        update_price_index(snapshots)
+        
+        # Report listings matching any saved price alert rules
+        evaluate_new_snapshots(snapshots)
+        
+        # Process each event, oldest snapshot first so the latest one is kept for each event
+        events = []
+        for snapshot in sorted(snapshots):
+            snapshot_time = parse_snapshot_datetime(snapshot) or datetime.now(timezone.utc)
+            # Stored as naive UTC, matching the column type
+            events.extend((event_data, snapshot_time.replace(tzinfo=None)) for event_data in snapshots[snapshot])
         
-        # Process each event
         processed_count = 0
         error_count = 0
-        for event_data in events:
+        for event_data, snapshot_timestamp in events:
             try:
                 if not event_data.get('id'):
                     print("Skipping event without ID")
                     continue
                     
-                snapshot_timestamp = datetime.now()
                 event, tickets = process_event_data(event_data, snapshot_timestamp)
                 
                 # Skip events without required data
@@ -250,7 +266,8 @@ def populate_database():
 
 def test_s3_loading():
     """Test function to verify S3 loading functionality"""
-    events = load_json_from_s3()
+    snapshots = load_json_from_s3()
+    events = [event for snapshot_events in snapshots.values() for event in snapshot_events]
     print(f"\nSuccessfully loaded {len(events)} events")
     if events:
         print("\nSample event data:")
@@ -0,0 +1,246 @@
+"""
+Price alerts evaluated against each new snapshot.
+
+Rules are indexed by event id, category and genre, so a snapshot is checked by
+looking up the rules that apply to each event rather than testing every rule
+against every listing. Fired listings are remembered so only new matches are reported.
+"""
+
+import json
+import os
+import pathlib
+from bisect import bisect_right
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Union
+
+from price_index import available_listings, parse_snapshot_timestamp
+
+ALERT_RULES_PATH = pathlib.Path(os.getenv('ALERT_RULES_PATH', pathlib.Path(__file__).parent / 'data' / 'alert_rules.json'))
+ALERT_STATE_PATH = pathlib.Path(os.getenv('ALERT_STATE_PATH', pathlib.Path(__file__).parent / 'data' / 'alert_state.json'))
+
+@dataclass
+class AlertRule:
+    rule_id: str
+    max_price: float
+    event_id: Optional[str] = None
+    category: Optional[str] = None  # e.g. 'music-tickets'
+    genre: Optional[str] = None  # e.g. 'Comedy'
+    min_listings: int = 1
+    min_hours_to_start: Optional[float] = None
+    max_hours_to_start: Optional[float] = None
+
+def load_rules(path: pathlib.Path = ALERT_RULES_PATH) -> List[AlertRule]:
+    """Load rules from a JSON list of AlertRule fields, or no rules if the file doesn't exist"""
+    path = pathlib.Path(path)
+    if not path.exists():
+        return []
+    with open(path, 'r') as f:
+        return [AlertRule(**rule) for rule in json.load(f)]
+
+def save_rules(rules: List[AlertRule], path: pathlib.Path = ALERT_RULES_PATH):
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump([asdict(rule) for rule in rules], f, indent=2)
+
+def event_category(event_data) -> Optional[str]:
+    """Category slug of an event, e.g. 'comedy-tickets'"""
+    # Added by init_db.load_json_from_s3, otherwise taken from the category tag
+    if event_data.get('category'):
+        return event_data['category']
+    slug = (event_data.get('categoryTag') or {}).get('slug')
+    return slug.rstrip('/').split('/')[-1] if slug else None
+
+def event_genre(event_data) -> Optional[str]:
+    title = (event_data.get('genreTag') or {}).get('title')
+    return title.lower() if title else None
+
+class AlertEngine:
+    def __init__(self, rules: Optional[List[AlertRule]] = None, state_path: Optional[pathlib.Path] = ALERT_STATE_PATH):
+        self.rules_by_event: Dict[str, List[AlertRule]] = {}
+        self.rules_by_category: Dict[str, List[AlertRule]] = {}
+        self.rules_by_genre: Dict[str, List[AlertRule]] = {}
+        self.unscoped_rules: List[AlertRule] = []
+        self.rule_ids: set = set()
+        self.state_path = pathlib.Path(state_path) if state_path else None
+
+        # rule_id -> event_id -> ids of listings already reported
+        self.fired: Dict[str, Dict[str, set]] = {}
+        # Newest snapshot folder name evaluated, snapshots are evaluated in sorted order
+        self.last_evaluated_snapshot: Optional[str] = None
+        # Events in the newest snapshot passed to evaluate(), used to prune fired listings
+        self.latest_snapshot_ts: Optional[int] = None
+        self.latest_event_ids: Optional[set] = None
+        if self.state_path and self.state_path.exists():
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+            self.fired = {
+                rule_id: {event_id: set(listing_ids) for event_id, listing_ids in events.items()}
+                for rule_id, events in state['fired'].items()
+            }
+            self.last_evaluated_snapshot = state.get('last_evaluated_snapshot')
+
+        for rule in rules or []:
+            self.add_rule(rule)
+
+    def add_rule(self, rule: AlertRule):
+        """Register a rule under the most specific key it is scoped by"""
+        self.rule_ids.add(rule.rule_id)
+        if rule.event_id:
+            self.rules_by_event.setdefault(str(rule.event_id), []).append(rule)
+        elif rule.category:
+            self.rules_by_category.setdefault(rule.category, []).append(rule)
+        elif rule.genre:
+            self.rules_by_genre.setdefault(rule.genre.lower(), []).append(rule)
+        else:
+            self.unscoped_rules.append(rule)
+
+    def _candidate_rules(self, event_id: str, category: Optional[str], genre: Optional[str]) -> List[AlertRule]:
+        rules = self.rules_by_event.get(event_id, []) + self.unscoped_rules
+        if category:
+            rules = rules + self.rules_by_category.get(category, [])
+        if genre:
+            rules = rules + self.rules_by_genre.get(genre, [])
+        return rules
+
+    @staticmethod
+    def _rule_applies(rule: AlertRule, category: Optional[str], genre: Optional[str], hours_to_start: Optional[float]) -> bool:
+        # Rules are indexed by a single key, the remaining scope fields are checked here
+        if rule.category and rule.category != category:
+            return False
+        if rule.genre and rule.genre.lower() != genre:
+            return False
+        if rule.min_hours_to_start is not None or rule.max_hours_to_start is not None:
+            if hours_to_start is None:
+                return False
+            if rule.min_hours_to_start is not None and hours_to_start < rule.min_hours_to_start:
+                return False
+            if rule.max_hours_to_start is not None and hours_to_start > rule.max_hours_to_start:
+                return False
+        return True
+
+    def evaluate(self, snapshot: Union[Dict[str, list], List[dict]], snapshot_ts: int) -> List[dict]:
+        """
+        Check a snapshot against all rules and return listings that have not fired before.
+
+        Args:
+            snapshot: An all_events.json snapshot (category -> events) or a list of events
+            snapshot_ts: Unix timestamp of the snapshot, used for the time-to-start window
+
+        Returns:
+            One dict per newly matched listing
+        """
+        if isinstance(snapshot, dict):
+            events = [dict(event_data, category=category) for category, events in snapshot.items() for event_data in events]
+        else:
+            events = snapshot
+
+        if self.latest_snapshot_ts is None or snapshot_ts >= self.latest_snapshot_ts:
+            self.latest_snapshot_ts = snapshot_ts
+            self.latest_event_ids = {str(event_data.get('id')) for event_data in events}
+
+        matches = []
+        for event_data in events:
+            event_id = str(event_data.get('id'))
+            category = event_category(event_data)
+            genre = event_genre(event_data)
+            rules = self._candidate_rules(event_id, category, genre)
+            if not rules:
+                continue
+
+            starts_at = event_data.get('startsAt')
+            hours_to_start = (int(starts_at) - snapshot_ts) / 3600 if starts_at else None
+            rules = [rule for rule in rules if self._rule_applies(rule, category, genre, hours_to_start)]
+            if not rules:
+                continue
+
+            # Sort listings once so each rule's matches are a prefix
+            listings = sorted(available_listings(event_data), key=lambda ticket: ticket['price'])
+            prices = [ticket['price'] for ticket in listings]
+            for rule in rules:
+                matched = listings[:bisect_right(prices, rule.max_price)]
+                if len(matched) < rule.min_listings:
+                    continue
+
+                fired = self.fired.setdefault(rule.rule_id, {}).setdefault(event_id, set())
+                for ticket in matched:
+                    # Listings are deduplicated by id, so ones without an id can't be reported reliably
+                    if not ticket.get('id'):
+                        continue
+                    listing_id = str(ticket['id'])
+                    if listing_id in fired:
+                        continue
+                    fired.add(listing_id)
+                    matches.append({
+                        'rule_id': rule.rule_id,
+                        'event_id': event_id,
+                        'title': event_data.get('title'),
+                        'listing_id': listing_id,
+                        'price': ticket['price'],
+                        'listings_under_max': len(matched),
+                        'starts_at': starts_at,
+                    })
+        return matches
+
+    def prune(self):
+        """Forget fired listings of rules that no longer exist and events no longer listed"""
+        self.fired = {
+            rule_id: {
+                event_id: listing_ids for event_id, listing_ids in events.items()
+                if self.latest_event_ids is None or event_id in self.latest_event_ids
+            }
+            for rule_id, events in self.fired.items()
+            if rule_id in self.rule_ids
+        }
+        self.fired = {rule_id: events for rule_id, events in self.fired.items() if events}
+
+    def save(self):
+        """Persist which listings have fired so later runs only report new matches"""
+        if not self.state_path:
+            return
+        # Keep the state file from growing with every snapshot
+        self.prune()
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_path, 'w') as f:
+            json.dump({
+                'last_evaluated_snapshot': self.last_evaluated_snapshot,
+                'fired': {
+                    rule_id: {event_id: sorted(listing_ids) for event_id, listing_ids in events.items()}
+                    for rule_id, events in self.fired.items()
+                },
+            }, f)
+
+def evaluate_new_snapshots(
+    snapshots: Dict[str, List[dict]],
+    rules_path: pathlib.Path = ALERT_RULES_PATH,
+    state_path: pathlib.Path = ALERT_STATE_PATH,
+) -> List[dict]:
+    """
+    Evaluate the saved rules against any snapshots that haven't been evaluated yet.
+
+    Args:
+        snapshots: Events keyed by snapshot folder name, as returned by init_db.load_json_from_s3
+        rules_path: JSON file of rules, see save_rules
+        state_path: JSON file recording the last evaluated snapshot and fired listings
+
+    Returns:
+        Newly matched listings, oldest snapshot first
+    """
+    engine = AlertEngine(load_rules(rules_path), state_path=state_path)
+    matches = []
+    for snapshot in sorted(snapshots):
+        if engine.last_evaluated_snapshot is not None and snapshot <= engine.last_evaluated_snapshot:
+            continue
+        snapshot_ts = parse_snapshot_timestamp(snapshot)
+        if snapshot_ts is None:
+            continue
+        for match in engine.evaluate(snapshots[snapshot], snapshot_ts):
+            matches.append(dict(match, snapshot=snapshot))
+        # Recorded even without rules, so newly added rules only apply to future snapshots
+        engine.last_evaluated_snapshot = snapshot
+    engine.save()
+
+    for match in matches:
+        print(f"Price alert {match['rule_id']}: {match['title']} ({match['event_id']}) listed at ${match['price']}")
+    print(f"Found {len(matches)} new price alert matches")
+    return matches
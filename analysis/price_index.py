@@ -0,0 +1,260 @@
+"""
+Per-event price time-series built from the scraped snapshots.
+
+Each row summarises one event in one snapshot (snapshot_ts, min/median/max price,
+listing count). Rows are stored as columnar .npy files sorted by event and then by
+snapshot, with an offsets array marking where each event's rows start, so the
+history of an event is a slice of each column rather than a scan of the tickets table.
+"""
+
+import json
+import os
+import pathlib
+from datetime import datetime, timezone
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+PRICE_INDEX_DIR = pathlib.Path(os.getenv('PRICE_INDEX_DIR', pathlib.Path(__file__).parent / 'data' / 'price_index'))
+
+COLUMNS = {
+    'snapshot_ts': np.int64,
+    'min_price': np.float64,
+    'median_price': np.float64,
+    'max_price': np.float64,
+    'listing_count': np.int32,
+}
+
+SNAPSHOT_FORMATS = ['%Y%m%d_%H%M%S', '%Y%m%d']
+
+def parse_snapshot_datetime(snapshot: str) -> Optional[datetime]:
+    """Convert a snapshot folder name (e.g. 20241208_120000) to a datetime"""
+    for fmt in SNAPSHOT_FORMATS:
+        try:
+            # The Lambda names folders using datetime.now() in UTC
+            return datetime.strptime(snapshot, fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    return None
+
+def parse_snapshot_timestamp(snapshot: str) -> Optional[int]:
+    """Convert a snapshot folder name (e.g. 20241208_120000) to a Unix timestamp"""
+    snapshot_time = parse_snapshot_datetime(snapshot)
+    return int(snapshot_time.timestamp()) if snapshot_time else None
+
+def available_listings(event_data) -> List[dict]:
+    """Extract the available listings with a price from an event"""
+    available = event_data.get('tickets', {}).get('available', [])
+    # The API returns an object keyed by position when there are listings, and a list otherwise
+    if isinstance(available, dict):
+        available = available.values()
+    return [ticket for ticket in available if ticket.get('price') is not None]
+
+def listing_prices(event_data) -> List[float]:
+    return [ticket['price'] for ticket in available_listings(event_data)]
+
+def snapshot_stats(events: Iterable[dict]) -> Dict[str, tuple]:
+    """(min, median, max, count) of listing prices per event, NaN prices when there are no listings"""
+    # An event can be listed under more than one category, keep a single row per snapshot
+    stats = {}
+    for event_data in events:
+        event_id = event_data.get('id')
+        if not event_id:
+            continue
+        prices = listing_prices(event_data)
+        if prices:
+            stats[event_id] = (min(prices), float(np.median(prices)), max(prices), len(prices))
+        else:
+            stats[event_id] = (np.nan, np.nan, np.nan, 0)
+    return stats
+
+def row_keys(event_pos: np.ndarray, snapshot_ts: np.ndarray) -> np.ndarray:
+    """Single int64 sort key per row, ordering rows by event position and then snapshot"""
+    # Unix timestamps fit in 34 bits until the year 2514
+    return (event_pos << 34) | snapshot_ts
+
+class PriceIndex:
+    def __init__(self, path: pathlib.Path = PRICE_INDEX_DIR):
+        self.path = pathlib.Path(path)
+        meta_path = self.path / 'meta.json'
+        if meta_path.exists():
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            self.event_ids = meta['event_ids']
+            self.snapshots = set(meta['snapshots'])
+            self.offsets = np.load(self.path / 'offsets.npy', mmap_mode='r')
+            self.columns = {name: np.load(self.path / f'{name}.npy', mmap_mode='r') for name in COLUMNS}
+        else:
+            self.event_ids = []
+            self.snapshots = set()
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.event_positions = {event_id: i for i, event_id in enumerate(self.event_ids)}
+
+    def __len__(self):
+        return len(self.columns['snapshot_ts'])
+
+    def add_snapshot(self, snapshot_ts: int, events: Iterable[dict]) -> int:
+        """Merge one snapshot's events into the index. Returns the number of rows added."""
+        return self.add_snapshots({snapshot_ts: events})
+
+    def add_snapshots(self, snapshots: Dict[int, Iterable[dict]]) -> int:
+        """
+        Merge the events of any snapshots not yet in the index.
+
+        All new rows are merged into the existing columns in a single pass, so adding
+        many snapshots at once copies the index once rather than once per snapshot.
+
+        Args:
+            snapshots: Events keyed by snapshot Unix timestamp
+
+        Returns:
+            Number of rows added
+        """
+        new_event_pos, new_ts, new_stats = [], [], []
+        for snapshot_ts in sorted(snapshots):
+            if snapshot_ts in self.snapshots:
+                continue
+            for event_id, row in snapshot_stats(snapshots[snapshot_ts]).items():
+                if event_id not in self.event_positions:
+                    self.event_positions[event_id] = len(self.event_ids)
+                    self.event_ids.append(event_id)
+                new_event_pos.append(self.event_positions[event_id])
+                new_ts.append(snapshot_ts)
+                new_stats.append(row)
+            self.snapshots.add(snapshot_ts)
+        if not new_ts:
+            return 0
+
+        n_old_events = len(self.offsets) - 1
+        new_event_pos = np.asarray(new_event_pos, dtype=np.int64)
+        new_ts = np.asarray(new_ts, dtype=np.int64)
+        new_stats = np.asarray(new_stats, dtype=np.float64)
+
+        # Rows are ordered by (event position, snapshot_ts). Existing rows are already in that
+        # order, so sorting only the new rows and inserting them at their searchsorted positions
+        # merges them in without re-sorting the index.
+        old_event_pos = np.repeat(np.arange(n_old_events, dtype=np.int64), np.diff(self.offsets))
+        old_keys = row_keys(old_event_pos, np.asarray(self.columns['snapshot_ts']))
+        new_keys = row_keys(new_event_pos, new_ts)
+        order = np.argsort(new_keys, kind='stable')
+        positions = np.searchsorted(old_keys, new_keys[order])
+        values = {
+            'snapshot_ts': new_ts,
+            'min_price': new_stats[:, 0],
+            'median_price': new_stats[:, 1],
+            'max_price': new_stats[:, 2],
+            'listing_count': new_stats[:, 3],
+        }
+        self.columns = {
+            name: np.insert(np.asarray(column), positions, values[name][order].astype(COLUMNS[name]))
+            for name, column in self.columns.items()
+        }
+
+        counts = np.zeros(len(self.event_ids), dtype=np.int64)
+        counts[:n_old_events] = np.diff(self.offsets)
+        np.add.at(counts, new_event_pos, 1)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        return len(new_ts)
+
+    def save(self):
+        """Write the index to disk, replacing files so existing memory maps stay valid"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        arrays = dict(self.columns, offsets=self.offsets)
+        for name, array in arrays.items():
+            tmp_path = self.path / f'{name}.tmp.npy'
+            np.save(tmp_path, np.asarray(array))
+            os.replace(tmp_path, self.path / f'{name}.npy')
+
+        tmp_path = self.path / 'meta.json.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'event_ids': self.event_ids, 'snapshots': sorted(self.snapshots)}, f)
+        os.replace(tmp_path, self.path / 'meta.json')
+
+    def history(self, event_id: str) -> Optional[Dict[str, np.ndarray]]:
+        """Return the event's columns, ordered by snapshot, or None if the event is unknown"""
+        event_pos = self.event_positions.get(event_id)
+        if event_pos is None:
+            return None
+        start, end = self.offsets[event_pos], self.offsets[event_pos + 1]
+        return {name: column[start:end] for name, column in self.columns.items()}
+
+    def cheapest_current(self) -> Dict[str, float]:
+        """Return the cheapest listing price of each event with listings in the latest snapshot"""
+        if not self.snapshots:
+            return {}
+        # Rows are ordered by snapshot within each event, so the last row is its latest
+        last_rows = np.asarray(self.offsets[1:]) - 1
+        latest = self.columns['snapshot_ts'][last_rows] == max(self.snapshots)
+        listed = self.columns['listing_count'][last_rows] > 0
+        selected = np.flatnonzero(latest & listed)
+        min_prices = self.columns['min_price'][last_rows[selected]]
+        return {self.event_ids[i]: float(price) for i, price in zip(selected, min_prices)}
+
+def update_price_index(snapshots: Dict[str, List[dict]], path: pathlib.Path = PRICE_INDEX_DIR) -> int:
+    """
+    Add any snapshots not yet in the index.
+
+    Args:
+        snapshots: Events keyed by snapshot folder name, as returned by init_db.load_json_from_s3
+        path: Directory holding the index files
+
+    Returns:
+        Number of rows added
+    """
+    by_snapshot = {}
+    for snapshot, events in snapshots.items():
+        snapshot_ts = parse_snapshot_timestamp(snapshot)
+        if snapshot_ts is None:
+            continue
+        by_snapshot.setdefault(snapshot_ts, []).extend(events)
+
+    index = PriceIndex(path)
+    added = index.add_snapshots(by_snapshot)
+
+    if added:
+        index.save()
+        clear_cache()
+    print(f"Added {added} rows to the price index ({len(index)} rows total)")
+    return added
+
+def index_version() -> int:
+    """Modification time of the index on disk, which changes whenever it is saved"""
+    try:
+        return (PRICE_INDEX_DIR / 'meta.json').stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+# The cached lookups are keyed on index_version(), so a kernel picks up an index saved
+# by another process (e.g. init_db.py) on its next query without a restart
+
+@lru_cache(maxsize=1)
+def _load_price_index(path: pathlib.Path, version: int) -> PriceIndex:
+    return PriceIndex(path)
+
+@lru_cache(maxsize=256)
+def _price_history(event_id: str, version: int) -> Optional[Dict[str, np.ndarray]]:
+    return get_price_index().history(event_id)
+
+@lru_cache(maxsize=1)
+def _cheapest_current_listings(version: int) -> MappingProxyType:
+    return MappingProxyType(get_price_index().cheapest_current())
+
+def get_price_index() -> PriceIndex:
+    return _load_price_index(PRICE_INDEX_DIR, index_version())
+
+def price_history(event_id: str) -> Optional[Dict[str, np.ndarray]]:
+    """Price history of an event as read-only arrays, e.g. pd.DataFrame(price_history('458777'))"""
+    return _price_history(event_id, index_version())
+
+def cheapest_current_listings() -> MappingProxyType:
+    """Cheapest listing price per event in the latest snapshot"""
+    return _cheapest_current_listings(index_version())
+
+def clear_cache():
+    """Drop cached lookups, e.g. after changing PRICE_INDEX_DIR"""
+    _load_price_index.cache_clear()
+    _price_history.cache_clear()
+    _cheapest_current_listings.cache_clear()
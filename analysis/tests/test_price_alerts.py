@@ -0,0 +1,139 @@
+import copy
+import json
+import pathlib
+
+import pytest
+
+from price_alerts import AlertEngine, AlertRule, evaluate_new_snapshots, load_rules, save_rules
+
+EXAMPLE_PATH = pathlib.Path(__file__).parent.parent.parent / 'resources' / 'example.json'
+
+# Events in the example, all Comedy genre in the comedy-tickets category
+DAN_AND_PHIL_9TH = '458777'  # starts 1733734800, cheapest listings 49, 50
+DAN_AND_PHIL_10TH = '458778'  # starts 1733821200, cheapest listings 50, 60
+# 10 hours before the first event, and 34 hours before the second
+SNAPSHOT_TS = 1733734800 - 10 * 3600
+
+@pytest.fixture
+def events():
+    with open(EXAMPLE_PATH, 'r') as f:
+        return json.load(f)
+
+def with_new_listing(events, listing_id, price):
+    events = copy.deepcopy(events)
+    events[0]['tickets']['available']['new'] = {'id': listing_id, 'price': price}
+    return events
+
+def evaluate(rules, events, snapshot_ts=SNAPSHOT_TS):
+    return AlertEngine(rules, state_path=None).evaluate(events, snapshot_ts)
+
+def matched(matches):
+    return sorted((match['event_id'], match['price']) for match in matches)
+
+def test_category_rule(events):
+    matches = evaluate([AlertRule(rule_id='comedy', category='comedy-tickets', max_price=50)], events)
+    assert matched(matches) == [(DAN_AND_PHIL_9TH, 49), (DAN_AND_PHIL_9TH, 50), (DAN_AND_PHIL_10TH, 50)]
+
+    assert evaluate([AlertRule(rule_id='music', category='music-tickets', max_price=1000)], events) == []
+
+def test_category_from_snapshot_key(events):
+    rules = [AlertRule(rule_id='comedy', category='comedy-tickets', max_price=49)]
+    # An all_events.json snapshot keys events by category rather than tagging them
+    matches = evaluate(rules, {'comedy-tickets': events})
+    assert matched(matches) == [(DAN_AND_PHIL_9TH, 49)]
+
+def test_genre_rule(events):
+    matches = evaluate([AlertRule(rule_id='comedy', genre='Comedy', max_price=49)], events)
+    assert matched(matches) == [(DAN_AND_PHIL_9TH, 49)]
+
+    assert evaluate([AlertRule(rule_id='rock', genre='Rock', max_price=1000)], events) == []
+
+def test_event_id_rule(events):
+    matches = evaluate([AlertRule(rule_id='10th', event_id=DAN_AND_PHIL_10TH, max_price=60)], events)
+    assert matched(matches) == [(DAN_AND_PHIL_10TH, 50), (DAN_AND_PHIL_10TH, 60)]
+
+def test_event_id_rule_checks_other_scope_fields(events):
+    rules = [AlertRule(rule_id='10th', event_id=DAN_AND_PHIL_10TH, category='music-tickets', max_price=60)]
+    assert evaluate(rules, events) == []
+
+def test_min_listings(events):
+    rules = [AlertRule(rule_id='10th', event_id=DAN_AND_PHIL_10TH, max_price=60, min_listings=2)]
+    assert len(evaluate(rules, events)) == 2
+
+    rules = [AlertRule(rule_id='10th', event_id=DAN_AND_PHIL_10TH, max_price=60, min_listings=3)]
+    assert evaluate(rules, events) == []
+
+def test_hours_to_start_window(events):
+    soon = [AlertRule(rule_id='soon', category='comedy-tickets', max_price=50, max_hours_to_start=24)]
+    assert matched(evaluate(soon, events)) == [(DAN_AND_PHIL_9TH, 49), (DAN_AND_PHIL_9TH, 50)]
+
+    later = [AlertRule(rule_id='later', category='comedy-tickets', max_price=50, min_hours_to_start=24)]
+    assert matched(evaluate(later, events)) == [(DAN_AND_PHIL_10TH, 50)]
+
+def test_matches_only_fire_once(events):
+    engine = AlertEngine([AlertRule(rule_id='comedy', category='comedy-tickets', max_price=50)], state_path=None)
+    assert len(engine.evaluate(events, SNAPSHOT_TS)) == 3
+    assert engine.evaluate(events, SNAPSHOT_TS) == []
+
+    # A new listing at an already reported price still fires
+    next_snapshot = copy.deepcopy(events)
+    next_snapshot[0]['tickets']['available']['new'] = {'id': 'new-listing', 'price': 49}
+    matches = engine.evaluate(next_snapshot, SNAPSHOT_TS + 6 * 3600)
+    assert [match['listing_id'] for match in matches] == ['new-listing']
+
+def test_listings_without_id_are_skipped(events):
+    for ticket in events[0]['tickets']['available'].values():
+        ticket.pop('id')
+    matches = evaluate([AlertRule(rule_id='9th', event_id=DAN_AND_PHIL_9TH, max_price=50)], events)
+    assert matches == []
+
+def test_evaluate_new_snapshots(events, tmp_path):
+    rules_path = tmp_path / 'alert_rules.json'
+    state_path = tmp_path / 'alert_state.json'
+    save_rules([AlertRule(rule_id='comedy', category='comedy-tickets', max_price=50)], rules_path)
+    assert load_rules(rules_path)[0].max_price == 50
+
+    snapshots = {'20241208_120000': events}
+    matches = evaluate_new_snapshots(snapshots, rules_path, state_path)
+    assert len(matches) == 3
+    assert {match['snapshot'] for match in matches} == {'20241208_120000'}
+
+    # Already evaluated snapshots are skipped, even with a new listing in them
+    events[0]['tickets']['available']['new'] = {'id': 'new-listing', 'price': 10}
+    assert evaluate_new_snapshots(snapshots, rules_path, state_path) == []
+
+    snapshots['20241208_180000'] = events
+    matches = evaluate_new_snapshots(snapshots, rules_path, state_path)
+    assert [(match['snapshot'], match['listing_id']) for match in matches] == [('20241208_180000', 'new-listing')]
+
+def test_evaluate_new_snapshots_without_rules(events, tmp_path):
+    state_path = tmp_path / 'alert_state.json'
+    assert evaluate_new_snapshots({'20241208_120000': events}, tmp_path / 'missing.json', state_path) == []
+    assert json.loads(state_path.read_text())['last_evaluated_snapshot'] == '20241208_120000'
+
+def test_older_snapshots_are_not_evaluated(events, tmp_path):
+    rules_path = tmp_path / 'alert_rules.json'
+    state_path = tmp_path / 'alert_state.json'
+    save_rules([AlertRule(rule_id='comedy', category='comedy-tickets', max_price=50)], rules_path)
+
+    evaluate_new_snapshots({'20241208_120000': events}, rules_path, state_path)
+    older = with_new_listing(events, 'older-listing', 10)
+    assert evaluate_new_snapshots({'20241208_060000': older}, rules_path, state_path) == []
+
+def test_state_is_pruned(events, tmp_path):
+    rules_path = tmp_path / 'alert_rules.json'
+    state_path = tmp_path / 'alert_state.json'
+    save_rules([
+        AlertRule(rule_id='comedy', category='comedy-tickets', max_price=50),
+        AlertRule(rule_id='10th', event_id=DAN_AND_PHIL_10TH, max_price=60),
+    ], rules_path)
+    evaluate_new_snapshots({'20241208_120000': events}, rules_path, state_path)
+    fired = json.loads(state_path.read_text())['fired']
+    assert set(fired) == {'comedy', '10th'}
+    assert set(fired['comedy']) == {DAN_AND_PHIL_9TH, DAN_AND_PHIL_10TH}
+
+    # The 10th rule is removed, and the 9th has started so it's no longer listed
+    save_rules([AlertRule(rule_id='comedy', category='comedy-tickets', max_price=50)], rules_path)
+    evaluate_new_snapshots({'20241208_180000': events[1:]}, rules_path, state_path)
+    fired = json.loads(state_path.read_text())['fired']
+    assert fired == {'comedy': {DAN_AND_PHIL_10TH: ['6b905828-16ad-4790-9635-b4ace76d780a']}}
@@ -0,0 +1,110 @@
+import copy
+import json
+import math
+import pathlib
+
+import numpy as np
+import pytest
+
+import price_index
+from price_index import PriceIndex, parse_snapshot_timestamp, update_price_index
+
+EXAMPLE_PATH = pathlib.Path(__file__).parent.parent.parent / 'resources' / 'example.json'
+
+DAN_AND_PHIL_9TH = '458777'  # 13 listings from 49 to 111
+DAN_AND_PHIL_10TH = '458778'  # 8 listings from 50 to 100
+NO_LISTINGS = ['500202', '499855']
+EXAMPLE_EVENT_IDS = [DAN_AND_PHIL_9TH, DAN_AND_PHIL_10TH] + NO_LISTINGS
+
+@pytest.fixture
+def events():
+    with open(EXAMPLE_PATH, 'r') as f:
+        return json.load(f)
+
+def with_cheapest_price(events, event_id, price):
+    events = copy.deepcopy(events)
+    event_data = next(event_data for event_data in events if event_data['id'] == event_id)
+    event_data['tickets']['available']['cheap'] = {'id': 'cheap', 'price': price}
+    return events
+
+def test_parse_snapshot_timestamp_is_utc():
+    assert parse_snapshot_timestamp('20241208_120000') == 1733659200
+    assert parse_snapshot_timestamp('20241208') == 1733616000
+    assert parse_snapshot_timestamp('all_events.json') is None
+
+def test_snapshot_stats(events, tmp_path):
+    index = PriceIndex(tmp_path)
+    assert index.add_snapshot(1733659200, events) == 4
+
+    history = index.history(DAN_AND_PHIL_9TH)
+    assert list(history['snapshot_ts']) == [1733659200]
+    assert list(history['min_price']) == [49]
+    assert list(history['median_price']) == [91]
+    assert list(history['max_price']) == [111]
+    assert list(history['listing_count']) == [13]
+
+    history = index.history(DAN_AND_PHIL_10TH)
+    assert (history['min_price'][0], history['median_price'][0], history['max_price'][0]) == (50, 80, 100)
+    assert history['listing_count'][0] == 8
+
+    for event_id in NO_LISTINGS:
+        history = index.history(event_id)
+        assert history['listing_count'][0] == 0
+        assert all(math.isnan(history[name][0]) for name in ['min_price', 'median_price', 'max_price'])
+
+    assert index.history('unknown') is None
+
+def test_older_snapshot_merges_in_order(events, tmp_path):
+    update_price_index({'20241208_180000': events}, tmp_path)
+    # An older snapshot arrives later, with a new event and a cheaper listing
+    older = with_cheapest_price(events[:2], DAN_AND_PHIL_9TH, 20) + [{'id': 'new', 'tickets': {'available': []}}]
+    assert update_price_index({'20241208_120000': older}, tmp_path) == 3
+
+    index = PriceIndex(tmp_path)
+    assert index.event_ids == EXAMPLE_EVENT_IDS + ['new']
+    assert list(index.offsets) == [0, 2, 4, 5, 6, 7]
+    history = index.history(DAN_AND_PHIL_9TH)
+    assert list(history['snapshot_ts']) == [1733659200, 1733680800]
+    assert list(history['min_price']) == [20, 49]
+    assert list(index.history(DAN_AND_PHIL_10TH)['snapshot_ts']) == [1733659200, 1733680800]
+    assert list(index.history('new')['snapshot_ts']) == [1733659200]
+
+    # Merging into the memory-mapped index keeps every event's rows in snapshot order
+    assert update_price_index({'20241208_150000': events, '20241208_000000': events}, tmp_path) == 8
+    index = PriceIndex(tmp_path)
+    assert list(index.offsets) == [0, 4, 8, 11, 14, 15]
+    for event_id in EXAMPLE_EVENT_IDS:
+        snapshot_ts = index.history(event_id)['snapshot_ts']
+        assert list(snapshot_ts) == sorted(snapshot_ts)
+    assert list(index.history(DAN_AND_PHIL_9TH)['min_price']) == [49, 20, 49, 49]
+
+def test_repeat_update_adds_nothing(events, tmp_path):
+    snapshots = {'20241208_120000': events, '20241208_180000': events}
+    assert update_price_index(snapshots, tmp_path) == 8
+    assert update_price_index(snapshots, tmp_path) == 0
+    assert len(PriceIndex(tmp_path)) == 8
+
+def test_cheapest_current_after_reload(events, tmp_path):
+    update_price_index({'20241208_120000': events}, tmp_path)
+    # The 9th is no longer listed in the latest snapshot
+    latest = [with_cheapest_price(events, DAN_AND_PHIL_10TH, 30)[1]] + events[2:]
+    update_price_index({'20241208_180000': latest}, tmp_path)
+
+    index = PriceIndex(tmp_path)
+    assert isinstance(index.columns['min_price'], np.memmap)
+    assert index.cheapest_current() == {DAN_AND_PHIL_10TH: 30}
+
+def test_cached_lookups_see_index_saved_elsewhere(events, tmp_path, monkeypatch):
+    monkeypatch.setattr(price_index, 'PRICE_INDEX_DIR', tmp_path)
+    price_index.clear_cache()
+    assert price_index.price_history(DAN_AND_PHIL_9TH) is None
+    assert dict(price_index.cheapest_current_listings()) == {}
+
+    # Saved without clearing this process's cache, as another process would
+    index = PriceIndex(tmp_path)
+    index.add_snapshot(1733659200, events)
+    index.save()
+
+    assert list(price_index.price_history(DAN_AND_PHIL_9TH)['min_price']) == [49]
+    assert dict(price_index.cheapest_current_listings()) == {DAN_AND_PHIL_9TH: 49, DAN_AND_PHIL_10TH: 50}
+    price_index.clear_cache()
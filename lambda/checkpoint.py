@@ -0,0 +1,160 @@
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+
+from s3 import S3
+from tixel_api import Category
+from logger_config import setup_logger
+
+logger = setup_logger('checkpoint')
+
+MANIFEST_KEY = "checkpoints/current_run.json"
+
+# A run that runs out of time invokes its own continuation straight away, so every page of a
+# snapshot should be fetched within minutes. Older runs are abandoned rather than resumed by a
+# later scheduled invocation, since the feed shifts over time.
+MAX_RUN_AGE = timedelta(minutes=30)
+# Failed invocations of a run, e.g. a page that keeps erroring. Clean out-of-time stops don't count.
+MAX_FAILURES = 3
+
+class RunCheckpoint:
+    """
+    Tracks progress of a scrape run so it can be resumed by a later invocation.
+
+    Each completed page is stored as a partial object under
+    events/{timestamp}/parts/, and the manifest at MANIFEST_KEY records which
+    pages exist and where each category should resume. Once every category is
+    complete, finalise() combines the parts into events/{timestamp}/all_events.json.
+    Runs older than MAX_RUN_AGE or that have failed MAX_FAILURES times are
+    abandoned rather than resumed.
+    """
+
+    def __init__(self, s3: S3, manifest: Dict[str, Any]):
+        self.s3 = s3
+        self.manifest = manifest
+        self.logger = logger.getChild('RunCheckpoint')
+
+    @classmethod
+    def load_or_create(cls, s3: S3, city: str, now: Optional[datetime] = None) -> 'RunCheckpoint':
+        """Resume the in-progress run for this city, or start a new one"""
+        now = now or datetime.now(timezone.utc)
+        manifest = cls._load_manifest(s3)
+        checkpoint = None
+        if manifest and manifest.get('status') == 'in_progress' and manifest.get('city') == city:
+            checkpoint = cls(s3, manifest)
+            if checkpoint.is_stale(now):
+                checkpoint.abandon()
+                checkpoint = None
+            else:
+                logger.info(f"Resuming run {manifest['timestamp']} for {city} ({manifest['failures']} failures so far)")
+
+        if checkpoint is None:
+            timestamp = now.strftime('%Y%m%d_%H%M%S')
+            logger.info(f"Starting new run {timestamp} for {city}")
+            checkpoint = cls(s3, {
+                'timestamp': timestamp,
+                'city': city,
+                'status': 'in_progress',
+                'started_at': now.isoformat(),
+                'failures': 0,
+                'categories': {},
+            })
+            checkpoint.save()
+
+        # Categories added since the run started still need collecting
+        for category in Category:
+            checkpoint.manifest['categories'].setdefault(str(category), {
+                'next_page': 1,
+                'parts': [],
+                'complete': False,
+            })
+        return checkpoint
+
+    @staticmethod
+    def _load_manifest(s3: S3) -> Optional[Dict[str, Any]]:
+        data = s3.download_file(MANIFEST_KEY)
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring unreadable manifest at {MANIFEST_KEY}")
+            return None
+
+    @property
+    def timestamp(self) -> str:
+        return self.manifest['timestamp']
+
+    def is_stale(self, now: datetime) -> bool:
+        """Whether the run is too old or has failed too often to resume"""
+        if 'started_at' not in self.manifest or 'failures' not in self.manifest:
+            return True
+        started_at = datetime.fromisoformat(self.manifest['started_at'])
+        return now - started_at > MAX_RUN_AGE or self.manifest['failures'] >= MAX_FAILURES
+
+    def record_failure(self):
+        """Count a failed invocation towards MAX_FAILURES"""
+        self.manifest['failures'] += 1
+        self.save()
+
+    def abandon(self):
+        """Give up on the run and delete its parts, no snapshot is written for it"""
+        self.logger.warning(
+            f"Abandoning run {self.timestamp} (started {self.manifest.get('started_at')}, "
+            f"{self.manifest.get('failures')} failures)"
+        )
+        part_keys = [key for progress in self.manifest['categories'].values() for key in progress['parts']]
+        self.manifest['status'] = 'abandoned'
+        self.save()
+        if part_keys:
+            self.s3.delete_files(part_keys)
+
+    def next_page(self, category: Category) -> int:
+        return self.manifest['categories'][str(category)]['next_page']
+
+    def is_category_complete(self, category: Category) -> bool:
+        return self.manifest['categories'][str(category)]['complete']
+
+    def is_complete(self) -> bool:
+        return all(progress['complete'] for progress in self.manifest['categories'].values())
+
+    def save(self):
+        self.s3.upload_file(MANIFEST_KEY, json.dumps(self.manifest).encode())
+
+    def save_page(self, category: Category, page: int, events: list, has_more: bool):
+        """Persist a completed page and record it in the manifest"""
+        progress = self.manifest['categories'][str(category)]
+        if events:
+            part_key = f"events/{self.timestamp}/parts/{category}/page-{page:04d}.json"
+            self.s3.upload_file(part_key, json.dumps(events).encode())
+            if part_key not in progress['parts']:
+                progress['parts'].append(part_key)
+        progress['next_page'] = page + 1
+        progress['complete'] = not has_more
+        self.save()
+        self.logger.debug(f"Checkpointed {category} page {page} ({len(events)} events, complete={not has_more})")
+
+    def finalise(self) -> Dict[str, list]:
+        """Combine all parts into the run's snapshot and mark the run complete"""
+        all_data = {}
+        part_keys = []
+        for category, progress in self.manifest['categories'].items():
+            events = []
+            for part_key in progress['parts']:
+                data = self.s3.download_file(part_key)
+                if data is None:
+                    raise RuntimeError(f"Missing checkpoint part '{part_key}' for run {self.timestamp}")
+                events.extend(json.loads(data))
+            all_data[category] = events
+            part_keys.extend(progress['parts'])
+
+        combined_filename = f"events/{self.timestamp}/all_events.json"
+        self.logger.info(f"Uploading combined events file to {combined_filename}")
+        self.s3.upload_file(combined_filename, json.dumps(all_data).encode())
+
+        self.manifest['status'] = 'complete'
+        self.save()
+
+        if part_keys:
+            self.s3.delete_files(part_keys)
+        return all_data
@@ -1,38 +1,71 @@
 import json
-from datetime import datetime
+
+import boto3
 
 from s3 import S3
+from checkpoint import RunCheckpoint
 from tixel_api import TixelAPI, Category
 from logger_config import setup_logger
 
 logger = setup_logger('main')
 
+# Stop fetching new pages once less than this much time remains, leaving room to checkpoint
+TIME_MARGIN_MS = 30_000
+
+def _out_of_time(context) -> bool:
+    if context is None:
+        return False
+    return context.get_remaining_time_in_millis() < TIME_MARGIN_MS
+
+def _invoke_continuation(context, timestamp: str):
+    """Asynchronously invoke this function again to carry on with the run"""
+    logger.info(f"Invoking {context.function_name} to continue run {timestamp}")
+    boto3.client("lambda").invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType="Event",
+        Payload=json.dumps({'continue_run': timestamp}).encode(),
+    )
+
 def lambda_handler(event, context):
     city = "Sydney"
-    all_data = {}
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    logger.info(f"Starting event collection for {city} at {timestamp}")
+    checkpoint = None
     
     try:
         # Create a single API instance to reuse the session
         api = TixelAPI()
+        s3 = S3()
         
-        # Fetch events for all categories
+        # Resume an unfinished run if there is one, otherwise start a new one
+        checkpoint = RunCheckpoint.load_or_create(s3, city)
+        timestamp = checkpoint.timestamp
+        logger.info(f"Starting event collection for {city} at {timestamp}")
+        
+        # Fetch events for all categories, checkpointing after every page
         for category in Category:
-            logger.info(f"Processing category: {category}")
-            events = api.get_all_events_for_category(city, category)
-            all_data[str(category)] = events
-            logger.info(f"Completed {category}: {len(events)} events collected")
+            if checkpoint.is_category_complete(category):
+                logger.info(f"Skipping completed category: {category}")
+                continue
 
-        # Upload to S3
-        logger.info("Uploading data to S3")
-        s3 = S3()
-        
-        # Save combined file
-        combined_filename = f"events/{timestamp}/all_events.json"
-        logger.info(f"Uploading combined events file to {combined_filename}")
-        s3.upload_file(combined_filename, json.dumps(all_data).encode())
+            logger.info(f"Processing category: {category} from page {checkpoint.next_page(category)}")
+            for page, events, has_more in api.iter_event_pages(city, category, checkpoint.next_page(category)):
+                checkpoint.save_page(category, page, events, has_more)
+                if has_more and _out_of_time(context):
+                    break
+
+            if _out_of_time(context) and not checkpoint.is_complete():
+                logger.warning(f"Running out of time, continuing run {timestamp} in a new invocation")
+                _invoke_continuation(context, timestamp)
+                return {
+                    'statusCode': 202,
+                    'body': json.dumps({
+                        'message': 'Partial data stored, run continues in a new invocation',
+                        'timestamp': timestamp,
+                    })
+                }
+
+        # Combine the checkpointed pages into the final snapshot
+        logger.info("Finalising snapshot in S3")
+        all_data = checkpoint.finalise()
 
         total_events = sum(len(events) for events in all_data.values())
         logger.info(f"Successfully processed {len(all_data)} categories with {total_events} total events")
@@ -49,6 +82,11 @@ def lambda_handler(event, context):
 
     except Exception as e:
         logger.error(f"Error during execution: {str(e)}", exc_info=True)
+        if checkpoint is not None:
+            try:
+                checkpoint.record_failure()
+            except Exception:
+                logger.error("Failed to record the failure in the run manifest", exc_info=True)
         raise
 
 if __name__ == "__main__":
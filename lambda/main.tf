@@ -44,6 +44,7 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Action = [
           "s3:PutObject",
           "s3:GetObject",
+          "s3:DeleteObject",
           "s3:ListBucket"
         ]
         Resource = [
@@ -71,6 +72,23 @@ resource "aws_iam_role_policy" "lambda_policy" {
   })
 }
 
+# Allows a run that is running out of time to invoke its own continuation
+resource "aws_iam_role_policy" "lambda_self_invoke_policy" {
+  name = "tixel_scraper_lambda_self_invoke_policy"
+  role = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = "lambda:InvokeFunction"
+        Resource = aws_lambda_function.tixel_scraper.arn
+      }
+    ]
+  })
+}
+
 # Create a timestamp for 3 months from now
 resource "time_rotating" "function_expiry" {
   rotation_days = 90 # 3 months
@@ -1,4 +1,5 @@
 import boto3
+from typing import List, Optional
 from logger_config import setup_logger
 
 logger = setup_logger('s3')
@@ -37,6 +38,33 @@ class S3:
             self.logger.error(f"Failed to upload '{file_name}': {str(e)}", exc_info=True)
             raise
 
+    def download_file(self, file_name: str) -> Optional[bytes]:
+        """Return the object's contents, or None if it does not exist"""
+        self.logger.debug(f"Downloading '{file_name}'")
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=file_name)
+            return response["Body"].read()
+        except self.s3_client.exceptions.NoSuchKey:
+            self.logger.debug(f"'{file_name}' does not exist")
+            return None
+        except Exception as e:
+            self.logger.error(f"Failed to download '{file_name}': {str(e)}", exc_info=True)
+            raise
+
+    def delete_files(self, file_names: List[str]):
+        self.logger.info(f"Deleting {len(file_names)} objects")
+        # delete_objects accepts at most 1000 keys per request
+        for i in range(0, len(file_names), 1000):
+            batch = file_names[i:i + 1000]
+            try:
+                self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={"Objects": [{"Key": name} for name in batch], "Quiet": True},
+                )
+            except Exception as e:
+                self.logger.error(f"Failed to delete objects: {str(e)}", exc_info=True)
+                raise
+
 if __name__ == "__main__":
     s3 = S3()
     s3.upload_file("data.json", b'{"data": "test"}')
@@ -0,0 +1,5 @@
+import pathlib
+import sys
+
+# The Lambda modules import each other by bare name, as they do in the deployment package
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
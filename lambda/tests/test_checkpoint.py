@@ -0,0 +1,167 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import checkpoint
+import main
+from checkpoint import MANIFEST_KEY, RunCheckpoint
+from tixel_api import Category, TixelAPI, TixelAPIError
+
+CITY = "Sydney"
+PAGES_PER_CATEGORY = 2
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def upload_file(self, file_name: str, data: bytes):
+        self.objects[file_name] = data
+
+    def download_file(self, file_name: str):
+        return self.objects.get(file_name)
+
+    def delete_files(self, file_names):
+        for file_name in file_names:
+            self.objects.pop(file_name, None)
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(main, 'S3', lambda: fake)
+    return fake
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    """Serve PAGES_PER_CATEGORY pages per category, failing on any call number listed in fail_on"""
+    calls = {'count': 0, 'fail_on': set(), 'pages': []}
+
+    def get_events_for_category(self, city, category, page=1, limit=1000):
+        calls['count'] += 1
+        if calls['count'] in calls['fail_on']:
+            raise TixelAPIError(f"Failed to fetch {category} page {page} for {city}")
+        calls['pages'].append((str(category), page))
+        return {
+            'events': [{'id': f"{category}-{page}"}],
+            'hasMore': page < PAGES_PER_CATEGORY,
+        }
+
+    monkeypatch.setattr(TixelAPI, 'get_events_for_category', get_events_for_category)
+    return calls
+
+@pytest.fixture(autouse=True)
+def continuations(monkeypatch):
+    """Record continuation invocations instead of calling Lambda"""
+    calls = []
+    monkeypatch.setattr(main, '_invoke_continuation', lambda context, timestamp: calls.append(timestamp))
+    return calls
+
+def load_manifest(s3):
+    return json.loads(s3.objects[MANIFEST_KEY])
+
+def snapshot(s3, timestamp):
+    return json.loads(s3.objects[f"events/{timestamp}/all_events.json"])
+
+def test_run_resumes_after_failure_and_finalises_all_categories(s3, api_calls):
+    api_calls['fail_on'] = {4}
+
+    with pytest.raises(TixelAPIError):
+        main.lambda_handler(None, None)
+
+    manifest = load_manifest(s3)
+    timestamp = manifest['timestamp']
+    assert manifest['status'] == 'in_progress'
+    assert manifest['failures'] == 1
+    assert manifest['categories'][str(Category.MUSIC)]['complete']
+    assert manifest['categories'][str(Category.FESTIVAL)]['next_page'] == 2
+    assert not any(key.endswith('all_events.json') for key in s3.objects)
+
+    response = main.lambda_handler(None, None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['timestamp'] == timestamp
+    data = snapshot(s3, timestamp)
+    assert list(data) == [str(category) for category in Category]
+    for category in Category:
+        assert [event['id'] for event in data[str(category)]] == [f"{category}-1", f"{category}-2"]
+
+    # Completed pages are not fetched again, and the parts are cleaned up
+    assert api_calls['pages'].count((str(Category.MUSIC), 1)) == 1
+    assert api_calls['pages'].count((str(Category.FESTIVAL), 1)) == 1
+    assert not any('/parts/' in key for key in s3.objects)
+    assert load_manifest(s3)['status'] == 'complete'
+
+def test_out_of_time_returns_202_and_resumes(s3, api_calls, continuations):
+    # Under the margin as soon as the first page has been checkpointed
+    context = FakeContext(main.TIME_MARGIN_MS - 1)
+
+    response = main.lambda_handler(None, context)
+
+    assert response['statusCode'] == 202
+    manifest = load_manifest(s3)
+    assert manifest['status'] == 'in_progress'
+    assert manifest['categories'][str(Category.MUSIC)]['next_page'] == 2
+    assert api_calls['pages'] == [(str(Category.MUSIC), 1)]
+    assert continuations == [manifest['timestamp']]
+    assert manifest['failures'] == 0
+
+    response = main.lambda_handler(None, FakeContext(100_000))
+
+    assert response['statusCode'] == 200
+    assert len(continuations) == 1
+    assert json.loads(response['body'])['total_events'] == len(Category) * PAGES_PER_CATEGORY
+    assert len(api_calls['pages']) == len(Category) * PAGES_PER_CATEGORY
+
+def test_run_needing_many_invocations_finalises(s3, api_calls, continuations):
+    # Every invocation only has time for a single page
+    context = FakeContext(main.TIME_MARGIN_MS - 1)
+    invocations = 0
+    while True:
+        invocations += 1
+        response = main.lambda_handler(None, context)
+        if response['statusCode'] == 200:
+            break
+        assert response['statusCode'] == 202
+
+    total_pages = len(Category) * PAGES_PER_CATEGORY
+    assert invocations == total_pages
+    assert len(continuations) == total_pages - 1
+    assert len(set(continuations)) == 1
+    assert json.loads(response['body'])['total_events'] == total_pages
+    assert len(snapshot(s3, continuations[0])) == len(Category)
+    assert load_manifest(s3)['failures'] == 0
+
+def test_stale_run_is_abandoned(s3):
+    started = datetime(2024, 12, 8, 0, 0, tzinfo=timezone.utc)
+    run = RunCheckpoint.load_or_create(s3, CITY, now=started)
+    run.save_page(Category.MUSIC, 1, [{'id': '1'}], has_more=True)
+
+    resumed = RunCheckpoint.load_or_create(s3, CITY, now=started + timedelta(minutes=5))
+    assert resumed.timestamp == run.timestamp
+    assert resumed.next_page(Category.MUSIC) == 2
+
+    fresh = RunCheckpoint.load_or_create(s3, CITY, now=started + checkpoint.MAX_RUN_AGE + timedelta(minutes=1))
+    assert fresh.timestamp != run.timestamp
+    assert fresh.next_page(Category.MUSIC) == 1
+    assert not any('/parts/' in key for key in s3.objects)
+
+def test_run_is_abandoned_after_max_failures(s3):
+    started = datetime(2024, 12, 8, 0, 0, tzinfo=timezone.utc)
+    run = RunCheckpoint.load_or_create(s3, CITY, now=started)
+
+    for failure in range(1, checkpoint.MAX_FAILURES):
+        resumed = RunCheckpoint.load_or_create(s3, CITY, now=started + timedelta(minutes=failure))
+        assert resumed.timestamp == run.timestamp
+        resumed.record_failure()
+    resumed.record_failure()
+
+    fresh = RunCheckpoint.load_or_create(s3, CITY, now=started + timedelta(minutes=10))
+    assert fresh.timestamp != run.timestamp
+    assert fresh.manifest['failures'] == 0
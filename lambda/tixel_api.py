@@ -1,7 +1,7 @@
 import time
 import random
 import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from enum import Enum
@@ -9,6 +9,9 @@ from logger_config import setup_logger
 
 logger = setup_logger('tixel_api')
 
+class TixelAPIError(Exception):
+    """Raised when a page of events could not be fetched"""
+
 class Category(Enum):
     MUSIC = "music"
     FESTIVAL = "festival"
@@ -89,9 +92,9 @@ class TixelAPI:
         endpoint = f"https://tixel.com/nuxt-api/events-by-city/au/{city}?category={category}&dates=%7B%22named%22:%22this-month%22%7D&genres=&limit={limit}&availableOnly=false&page={page}&sortBy=date&sortOrder=asc"
         
         data = self._make_request(endpoint)
-        if not data:
+        if data is None:
             self.logger.error(f"Failed to fetch data for {category} page {page}")
-            return {}
+            raise TixelAPIError(f"Failed to fetch {category} page {page} for {city}")
         
         events_count = len(data.get('events', []))
         has_more = data.get('hasMore', False)
@@ -100,28 +103,34 @@ class TixelAPI:
         
         return data
 
-    def get_all_events_for_category(self, city: str, category: Category) -> list:
-        """Fetch all events for a category, handling pagination"""
-        self.logger.info(f"Starting collection of all events for {category} in {city}")
-        all_events = []
-        page = 1
+    def iter_event_pages(self, city: str, category: Category, start_page: int = 1) -> Iterator[Tuple[int, list, bool]]:
+        """Yield (page, events, has_more) for each page of a category, starting at start_page"""
+        page = start_page
         
         while True:
             data = self.get_events_for_category(city, category, page)
             events = data.get('events', [])
+            has_more = bool(events) and data.get('hasMore', False)
             if not events:
                 self.logger.info(f"No events found for {category} on page {page}")
-                break
-                
-            all_events.extend(events)
-            self.logger.debug(f"Added {len(events)} events from page {page}")
+            
+            yield page, events, has_more
             
             # Check if there are more pages
-            if not data.get('hasMore', False):
+            if not has_more:
                 self.logger.debug(f"No more pages available for {category}")
                 break
                 
             page += 1
+
+    def get_all_events_for_category(self, city: str, category: Category) -> list:
+        """Fetch all events for a category, handling pagination"""
+        self.logger.info(f"Starting collection of all events for {category} in {city}")
+        all_events = []
+        
+        for page, events, _ in self.iter_event_pages(city, category):
+            all_events.extend(events)
+            self.logger.debug(f"Added {len(events)} events from page {page}")
             
         self.logger.info(f"Completed collection for {category}. Total events: {len(all_events)}")
         return all_events